@@ -20,8 +20,17 @@ check_requirements() {
 # Run initial check
 check_requirements
 
-# Start your application with hot reload
-exec uvicorn src.main:app --host 0.0.0.0 --port 5000 --reload &
+# uvloop and httptools come with uvicorn[standard]; keep-alive outlasts
+# the default idle timeout of common reverse proxies
+UVICORN_OPTS="--host 0.0.0.0 --port 5000 --loop uvloop --http httptools --timeout-keep-alive 75"
+
+# Start your application with hot reload, or with multiple worker
+# processes when UVICORN_WORKERS is set (reload and workers are exclusive)
+if [ -n "${UVICORN_WORKERS}" ]; then
+    exec uvicorn src.main:app ${UVICORN_OPTS} --workers "${UVICORN_WORKERS}" &
+else
+    exec uvicorn src.main:app ${UVICORN_OPTS} --reload &
+fi
 
 # Watch for changes in requirements.txt
 while true; do
@@ -3,4 +3,15 @@ import os
 # Security configuration
 SECRET_KEY = os.environ.get("AUTH_SECRET")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = 60
+
+# argon2id parameters (OWASP baseline: 19 MiB, 2 passes, 1 lane)
+ARGON2_MEMORY_COST = 19456  # KiB
+ARGON2_TIME_COST = 2
+ARGON2_PARALLELISM = 1
+
+# Verified tokens and authenticated users kept in memory
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 30  # seconds
+USER_CACHE_SIZE = 5000
+USER_CACHE_TTL = 60  # seconds
@@ -1,64 +1,188 @@
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+from datetime import datetime, timedelta
+import logging
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import time
+from functools import lru_cache
 import jwt
-from passlib.context import CryptContext
+from cachetools import TTLCache
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHash, VerificationError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from ..database.dependencies import get_db
 from .models import TokenData
-from .config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from .config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ARGON2_MEMORY_COST,
+    ARGON2_TIME_COST,
+    ARGON2_PARALLELISM,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL
+)
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Password hashing configuration: new hashes use argon2id, existing bcrypt
+# hashes still verify and are upgraded on the next successful login
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
 
 # OAuth2 setup
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# JWT decoder with its options and algorithm list fixed once, rather than
+# normalized again on every request; tokens must carry exp and sub
+jwt_decoder = jwt.PyJWT(options={"require": ["exp", "sub"]})
+JWT_ALGORITHMS = (ALGORITHM,)
+
+# Verified token claims keyed by a digest of the token, and user rows keyed by
+# username, so repeat requests skip both signature checks and the users query
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Background writes in flight; holding references keeps them from being garbage collected
+_pending_writes = set()
+
+# User queries, listing only the columns the auth code reads
+GET_USER_QUERY = "SELECT username, password_hash, last_login FROM users WHERE username = :username"
+UPDATE_PASSWORD_HASH_QUERY = "UPDATE users SET password_hash = :password_hash WHERE username = :username"
+UPDATE_LAST_LOGIN_QUERY = "UPDATE users SET last_login = :last_login WHERE username = :username"
+
+@lru_cache(maxsize=None)
+def get_password_hasher() -> PasswordHasher:
+    """Build the argon2 hasher on the first password operation rather than at import"""
+    return PasswordHasher(
+        time_cost=ARGON2_TIME_COST,
+        memory_cost=ARGON2_MEMORY_COST,
+        parallelism=ARGON2_PARALLELISM
+    )
+
 def verify_password(plain_password, hashed_password):
     """Verify a password against a hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return verify_and_update_password(plain_password, hashed_password)[0]
+
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return (verified, new_hash); new_hash is set when the stored hash is outdated"""
+    if hashed_password.startswith(BCRYPT_PREFIXES):
+        try:
+            verified = bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+        except ValueError:
+            return False, None
+        return verified, get_password_hash(plain_password) if verified else None
+
+    try:
+        get_password_hasher().verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHash):
+        return False, None
+
+    if get_password_hasher().check_needs_rehash(hashed_password):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+@lru_cache(maxsize=None)
+def _dummy_password_hash() -> str:
+    """Hash verified for unknown usernames, built on first use"""
+    return get_password_hash("dummy password for unknown users")
+
+def _verify_dummy_password(plain_password) -> bool:
+    """Verify against the dummy hash (blocking; building it on first use is a full hash too)"""
+    return verify_password(plain_password, _dummy_password_hash())
 
 def get_password_hash(password):
     """Generate password hash"""
-    return pwd_context.hash(password)
+    return get_password_hasher().hash(password)
 
 async def get_user(db, username: str):
-    """Get user by username"""
-    query = "SELECT * FROM users WHERE username = :username"
-    return await db.fetch_one(query=query, values={"username": username})
+    """Get user by username, served from a short-lived cache when possible"""
+    user = _user_cache.get(username)
+    if user is None:
+        user = await db.fetch_one(query=GET_USER_QUERY, values={"username": username})
+        # Missing users aren't cached, so a fresh registration is seen immediately
+        if user is not None:
+            _user_cache[username] = user
+    return user
+
+def invalidate_user(username: str) -> None:
+    """Drop a cached user row after the row is written"""
+    _user_cache.pop(username, None)
 
 async def authenticate_user(db, username: str, password: str):
     """Authenticate user by username and password"""
     user = await get_user(db, username)
     
     if not user:
+        # Spend the same time verifying as for a real user, so response timing
+        # does not reveal which usernames exist
+        await asyncio.to_thread(_verify_dummy_password, password)
         return False
     
-    if not verify_password(password, user["password_hash"]):
+    # Hashing is deliberately slow, so keep it off the event loop
+    verified, new_hash = await asyncio.to_thread(verify_and_update_password, password, user["password_hash"])
+    if not verified:
         return False
+
+    # Rehash legacy bcrypt (or outdated argon2 parameters) now that we know the password
+    if new_hash:
+        await db.execute(
+            query=UPDATE_PASSWORD_HASH_QUERY,
+            values={"password_hash": new_hash, "username": username}
+        )
+        invalidate_user(username)
     
-    # Update last login timestamp
-    update_query = "UPDATE users SET last_login = :last_login WHERE username = :username"
-    await db.execute(
-        query=update_query, 
-        values={"last_login": datetime.now(), "username": username}
-    )
+    # Update last login timestamp without holding up the login response
+    task = asyncio.create_task(_record_login(db, username, datetime.now()))
+    _pending_writes.add(task)
+    task.add_done_callback(_finish_write)
     
     return user
 
+async def _record_login(db, username: str, last_login: datetime) -> None:
+    """Store a user's login time, then drop the now-stale cached row"""
+    await db.execute(
+        query=UPDATE_LAST_LOGIN_QUERY, 
+        values={"last_login": last_login, "username": username}
+    )
+    invalidate_user(username)
+
+def _finish_write(task: "asyncio.Task") -> None:
+    """Release a background write and log it if it failed"""
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background user update failed: %s", task.exception())
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
     
+    # exp is an epoch timestamp in UTC, so build the integer directly
     if expires_delta:
-        expire = datetime.now() + expires_delta
+        lifetime = expires_delta.total_seconds()
     else:
-        expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        lifetime = ACCESS_TOKEN_EXPIRE_MINUTES * 60
         
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": int(time.time() + lifetime)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_token(token: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Verify a JWT and return its (username, exp) claims.
+    Cached briefly so repeat requests with the same token skip signature verification;
+    invalid tokens raise and are never cached, expiry is re-checked by the caller.
+    """
+    key = hashlib.sha256(token.encode()).hexdigest()[:32]
+    claims = _token_cache.get(key)
+    if claims is None:
+        payload = jwt_decoder.decode(token, SECRET_KEY, algorithms=JWT_ALGORITHMS)
+        claims = _token_cache[key] = (payload.get("sub"), payload.get("exp"))
+    return claims
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
     """Verify token and return current user"""
     credentials_exception = HTTPException(
@@ -67,17 +191,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    print("🔐 Received token:", token)
-
     try:
         # Decode JWT
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        
-        username: str = payload.get("sub")
+        username, token_exp = decode_token(token)
         if username is None:
             raise credentials_exception
-        
-        token_exp = payload.get("exp")
+
+        # A memoized token may have expired since it was first verified
+        if token_exp is not None and token_exp <= time.time():
+            raise credentials_exception
+
         token_data = TokenData(username=username, exp=token_exp)
     except jwt.PyJWTError:
         raise credentials_exception
@@ -86,8 +209,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get
     user = await get_user(db, token_data.username)
     
     if user is None:
-        print("No user found in DB for username:", token_data.username)
+        logger.warning("No user found in DB for username: %s", token_data.username)
         raise credentials_exception
 
-    print("✅ Authenticated user ID:", token_data.username)
+    logger.debug("Authenticated user: %s", token_data.username)
     return user
\ No newline at end of file
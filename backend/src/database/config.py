@@ -1,41 +1,76 @@
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 
 # Embedding settings
-BATCH_SIZE = 1
+BATCH_SIZE = 32
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 10
 DIMENSION = 384
 
-VALID_CONTENT_TYPES = {
-    "application/pdf",
-    "text/plain",
-    "application/json"
-    # TODO: add more supported content types as needed
-}
+# Upload encoding is micro-batched: chunks from concurrent documents are merged
+# into one encode call of up to EMBED_BATCH_MAX chunks, waiting at most
+# EMBED_BATCH_WAIT seconds for more to arrive
+EMBED_BATCH_MAX = 256
+EMBED_BATCH_WAIT = 0.05
 
-def get_postgres_settings():
+# Device the embedding model runs on; "cuda" also loads it in half precision
+EMBEDDING_DEVICE = os.environ.get('EMBEDDING_DEVICE') or 'cpu'
+
+# Number of worker processes used to extract document text
+PARSE_WORKERS = os.cpu_count() or 1
+
+# Number of model files fetched from MinIO at once
+MODEL_DOWNLOAD_WORKERS = 8
+
+# asyncpg pool behind the shared Database; connections stay open between requests
+# and each keeps its own cache of prepared statements
+DB_POOL_MIN_SIZE = 5
+DB_POOL_MAX_SIZE = 20
+DB_STATEMENT_CACHE_SIZE = 256
+
+@dataclass(frozen=True)
+class PostgresSettings:
+    host: str
+    database: str
+    user: str
+    password: str
+    port: int
+
+    @property
+    def url(self) -> str:
+        return f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+
+@dataclass(frozen=True)
+class EmbeddingModelSettings:
+    model: str
+    revision: str
+
+@lru_cache(maxsize=None)
+def get_postgres_settings() -> PostgresSettings:
     """
     Get PostgreSQL settings from environment variables
     """
     if not os.environ.get('POSTGRES_USER') or not os.environ.get('POSTGRES_PASSWORD'):
         raise ValueError("PostgreSQL credentials not found in environment variables")
     
-    return {
-        'host': os.environ['POSTGRES_HOST'],
-        'database': os.environ['POSTGRES_DB'],
-        'user': os.environ['POSTGRES_USER'],
-        'password': os.environ['POSTGRES_PASSWORD'],
-        'port': os.environ['POSTGRES_PORT']
-    }
-
-def get_embedding_model_settings():
+    return PostgresSettings(
+        host=os.environ['POSTGRES_HOST'],
+        database=os.environ['POSTGRES_DB'],
+        user=os.environ['POSTGRES_USER'],
+        password=os.environ['POSTGRES_PASSWORD'],
+        port=int(os.environ['POSTGRES_PORT'])
+    )
+
+@lru_cache(maxsize=None)
+def get_embedding_model_settings() -> EmbeddingModelSettings:
     """
     Get embedding model settings from environment variables
     """
     if not os.environ.get('EMBEDDING_MODEL') or not os.environ.get('EMBEDDING_MODEL_REVISION'):
         raise ValueError("Embedding model credentials not found in environment variables")
     
-    return {
-        'model': os.environ['EMBEDDING_MODEL'],
-        'revision': os.environ['EMBEDDING_MODEL_REVISION']
-    }
\ No newline at end of file
+    return EmbeddingModelSettings(
+        model=os.environ['EMBEDDING_MODEL'],
+        revision=os.environ['EMBEDDING_MODEL_REVISION']
+    )
\ No newline at end of file
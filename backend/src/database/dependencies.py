@@ -2,7 +2,12 @@ from fastapi import Depends, HTTPException, status, UploadFile, Form, File
 from functools import lru_cache
 import logging
 from databases import Database
-from .config import get_postgres_settings
+from .config import (
+    get_postgres_settings,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_STATEMENT_CACHE_SIZE
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +18,14 @@ def get_db() -> Database:
     """
     try:
         settings = get_postgres_settings()
-        database_url = f"postgresql://{settings['user']}:{settings['password']}@{settings['host']}:{settings['port']}/{settings['database']}"
-        return Database(database_url)
+        database_url = settings.url
+        # Extra options are passed through to asyncpg.create_pool
+        return Database(
+            database_url,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE
+        )
     except KeyError as e:
         logger.error(f"Missing environment variable: {e}")
         raise HTTPException(
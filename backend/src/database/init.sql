@@ -18,8 +18,29 @@ CREATE TABLE IF NOT EXISTS objects (
 CREATE TABLE IF NOT EXISTS embeddings (
   id SERIAL PRIMARY KEY,
   object_key VARCHAR(255) NOT NULL REFERENCES objects(object_key) ON DELETE CASCADE,
-  embedding vector,
-  text text
+  embedding halfvec(384),
+  text text,
+  text_search tsvector GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED
+);
+
+-- Approximate nearest neighbour index for cosine similarity search over
+-- half-precision vectors (half the memory and bandwidth of float32)
+CREATE INDEX IF NOT EXISTS embeddings_embedding_idx
+  ON embeddings USING hnsw (embedding halfvec_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS embeddings_object_key_idx ON embeddings (object_key);
+
+-- Full-text index for keyword and hybrid retrieval
+CREATE INDEX IF NOT EXISTS embeddings_text_search_idx ON embeddings USING gin (text_search);
+
+-- Chunk embeddings keyed by model and SHA-256 of the chunk text, so text
+-- that was embedded before (e.g. in an earlier version of a document) is
+-- never re-encoded
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  model VARCHAR(512) NOT NULL,
+  text_hash CHAR(64) NOT NULL,
+  embedding halfvec(384) NOT NULL,
+  PRIMARY KEY (model, text_hash)
 );
 
 -- File mapping table
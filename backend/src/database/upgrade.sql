@@ -0,0 +1,40 @@
+-- Brings a database created from an earlier init.sql up to the current schema.
+-- init.sql only runs on an empty data directory, so existing databases need
+-- this instead. Safe to run more than once. Needs pgvector >= 0.8.
+CREATE EXTENSION IF NOT EXISTS vector;
+ALTER EXTENSION vector UPDATE;
+
+-- Half-precision embeddings; the HNSW index is rebuilt below for the new type
+DO $$
+BEGIN
+  IF (
+    SELECT format_type(atttypid, atttypmod)
+    FROM pg_attribute
+    WHERE attrelid = 'embeddings'::regclass AND attname = 'embedding'
+  ) <> 'halfvec(384)' THEN
+    DROP INDEX IF EXISTS embeddings_embedding_idx;
+    ALTER TABLE embeddings
+      ALTER COLUMN embedding TYPE halfvec(384) USING embedding::halfvec(384);
+  END IF;
+END
+$$;
+
+-- Full-text search column for keyword and hybrid retrieval
+ALTER TABLE embeddings
+  ADD COLUMN IF NOT EXISTS text_search tsvector
+  GENERATED ALWAYS AS (to_tsvector('english', coalesce(text, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS embeddings_embedding_idx
+  ON embeddings USING hnsw (embedding halfvec_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS embeddings_object_key_idx ON embeddings (object_key);
+
+CREATE INDEX IF NOT EXISTS embeddings_text_search_idx ON embeddings USING gin (text_search);
+
+-- Chunk embeddings keyed by model and SHA-256 of the chunk text
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  model VARCHAR(512) NOT NULL,
+  text_hash CHAR(64) NOT NULL,
+  embedding halfvec(384) NOT NULL,
+  PRIMARY KEY (model, text_hash)
+);
@@ -1,20 +1,46 @@
 from fastapi import Depends, HTTPException, status
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
 import glob
+import hashlib
 import logging
 import os
-import json
-from typing import Any, Dict, List, Tuple
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import orjson
 from huggingface_hub import snapshot_download
 from minio import Minio
 from minio.error import S3Error
 from databases import Database
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-from .config import BATCH_SIZE, CHUNK_SIZE, CHUNK_OVERLAP, DIMENSION
+from .config import (
+    BATCH_SIZE,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    DIMENSION,
+    PARSE_WORKERS,
+    MODEL_DOWNLOAD_WORKERS,
+    EMBEDDING_DEVICE,
+    EMBED_BATCH_MAX,
+    EMBED_BATCH_WAIT
+)
 from ..minio.config import  MODEL_CACHE_DIR, MODELS_BUCKET
 
+# torch, langchain and PyMuPDF are imported where they are first used, so
+# processes that never embed or parse (e.g. EMBED_ON=false) don't load them
+if TYPE_CHECKING:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from sentence_transformers import SentenceTransformer
+
 logger = logging.getLogger(__name__)
 
+# Parsing documents such as PDFs is CPU bound, so it runs outside the event loop's process
+parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+
+# Encoding runs off the event loop on a single thread, so concurrent uploads
+# queue up behind one another instead of contending for the model and CPU
+embedding_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+
 def upload_model_to_minio(
     minio_client: Minio, 
     bucket_name: str, 
@@ -71,12 +97,22 @@ def download_model_from_minio(minio_client: Minio, bucket_name: str, model_path_
     # Create the local directory if it doesn't exist
     os.makedirs(full_model_local_path, exist_ok=True)
 
-    # Download from MinIO
-    for obj in minio_client.list_objects(bucket_name, prefix=full_model_object_path, recursive=True):
-        file_path = os.path.join(MODEL_CACHE_DIR, obj.object_name)
-        # Ensure the parent directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        minio_client.fget_object(bucket_name, obj.object_name, file_path)
+    # Download from MinIO, fetching the model's files concurrently
+    created_dirs = {full_model_local_path}
+    with ThreadPoolExecutor(max_workers=MODEL_DOWNLOAD_WORKERS) as pool:
+        downloads = []
+        for obj in minio_client.list_objects(bucket_name, prefix=full_model_object_path, recursive=True):
+            file_path = os.path.join(MODEL_CACHE_DIR, obj.object_name)
+            # Ensure the parent directory exists, probing each directory only once
+            parent_dir = os.path.dirname(file_path)
+            if parent_dir not in created_dirs:
+                os.makedirs(parent_dir, exist_ok=True)
+                created_dirs.add(parent_dir)
+            downloads.append(pool.submit(minio_client.fget_object, bucket_name, obj.object_name, file_path))
+
+        # Surface the first failed download
+        for download in downloads:
+            download.result()
     
     return full_model_local_path
 
@@ -122,53 +158,291 @@ def ensure_model_is_ready(
         )
 
 
-def create_embeddings(
-    model_path: str,
-    text: str,
-    chunk_size: int = CHUNK_SIZE,
-    chunk_overlap: int = CHUNK_OVERLAP
-) -> Tuple[List[str], List[List[float]]]:
+# Held while looking up or loading a model, so the upload and query threads
+# never load the same weights twice
+_model_load_lock = threading.Lock()
+
+
+def load_embedding_model(model_path: str) -> "SentenceTransformer":
     """
-    This function creates embeddings for a given file using a SentenceTransformer model.
-    Returns a tuple of (chunks, embeddings)
+    Load a SentenceTransformer model once per path and keep it resident,
+    so uploads and queries don't pay the load cost on every call.
     """
-    logger.info(f"[Embedding] Loading model from: {model_path}")
-    
-    # Load model and force CPU usage and PyTorch backend to avoid ONNX issues
-    model = SentenceTransformer(model_path)
-    model._target_device = "cpu"
+    with _model_load_lock:
+        return _load_embedding_model(model_path)
+
+
+@lru_cache(maxsize=None)
+def _load_embedding_model(model_path: str) -> "SentenceTransformer":
+    """
+    Load a SentenceTransformer model onto the configured device (blocking).
+    """
+    logger.info(f"[Embedding] Loading model from: {model_path} on {EMBEDDING_DEVICE}")
+    from sentence_transformers import SentenceTransformer
+
+    # Load model on the configured device and force the PyTorch backend to avoid ONNX issues
+    model = SentenceTransformer(model_path, device=EMBEDDING_DEVICE)
+    model._target_device = EMBEDDING_DEVICE
+    if EMBEDDING_DEVICE.startswith("cuda"):
+        # Half precision halves weight memory and runs on tensor cores
+        model.half()
     if hasattr(model, "_model") and hasattr(model._model, "config_dict"):
         model._model.config_dict["framework"] = "pt"
 
     logger.info("[Embedding] Model loaded")
+    return model
+
 
-    # Create text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
+def warm_up_embedding_model(model_path: str) -> None:
+    """
+    Load the embedding model and run one encode, so the first upload or
+    query doesn't pay for weight loading and lazy initialization.
+    """
+    load_embedding_model(model_path).encode("warmup")
+    logger.info("[Embedding] Model warmed up")
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    """
+    Build the text splitter for a chunking configuration once and reuse it.
+    Chunk sizes are measured in characters with len, so merging splits is a
+    running sum rather than a re-tokenization of every candidate chunk.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         length_function=len,
     )
 
-    # Split text into chunks
-    chunks = text_splitter.split_text(text)
+
+def split_text(
+    text: str,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP
+) -> List[str]:
+    """
+    Split a document's text into overlapping chunks for embedding.
+    """
+    chunks = get_text_splitter(chunk_size, chunk_overlap).split_text(text)
     logger.info(f"[Embedding] Split text into {len(chunks)} chunks")
+    return chunks
 
-    if not chunks:
-        logger.warning("[Embedding] No text chunks generated — skipping encoding")
-        return [], []
 
-    # Generate embeddings
+def encode_chunks(model_path: str, chunks: List[str]) -> List[List[float]]:
+    """
+    Encode text chunks with the resident SentenceTransformer model (blocking).
+    """
+    model = load_embedding_model(model_path)
+
     logger.info(f"[Embedding] Encoding {len(chunks)} chunks")
     embeddings = model.encode(
         chunks,
         batch_size=BATCH_SIZE,
-        device="cpu",  # Ensure CPU usage
+        device=EMBEDDING_DEVICE,
         convert_to_numpy=True  # Ensures .tolist() compatibility
     ).tolist()
     logger.info(f"[Embedding] Finished encoding {len(embeddings)} chunks")
 
-    return chunks, embeddings
+    return embeddings
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches encode requests from concurrent uploads. Requests are queued
+    and a single consumer merges the chunks of everything that arrives within
+    `max_wait` seconds (until the batch reaches `max_batch` chunks) into one
+    encode call per model, then hands each caller back its own slice of the
+    results. Until `start()` is called, `encode()` encodes directly.
+    """
+
+    def __init__(self, max_batch: int = EMBED_BATCH_MAX, max_wait: float = EMBED_BATCH_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+
+    def start(self) -> "asyncio.Task":
+        """Create the queue on the running loop and start the consumer task."""
+        self._queue = asyncio.Queue()
+        task = asyncio.create_task(self._run())
+        task.add_done_callback(self._stopped)
+        return task
+
+    def _stopped(self, task: "asyncio.Task") -> None:
+        """Fall back to encoding directly once the consumer stops, failing anything still queued."""
+        queue, self._queue = self._queue, None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("[Embedding] Batching worker stopped", exc_info=task.exception())
+        while not queue.empty():
+            _, _, future = queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Embedding batcher stopped"))
+
+    async def encode(self, model_path: str, chunks: List[str]) -> List[List[float]]:
+        """Encode chunks, batched together with other in-flight requests."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            return await loop.run_in_executor(embedding_pool, encode_chunks, model_path, chunks)
+
+        future = loop.create_future()
+        await self._queue.put((model_path, chunks, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect queued requests into batches and encode them until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                size = len(batch[0][1])
+
+                # Give concurrent uploads a moment to queue their chunks, then take
+                # whatever arrived; anything beyond max_batch waits for the next round
+                if size < self.max_batch:
+                    await asyncio.sleep(self.max_wait)
+                while size < self.max_batch and not self._queue.empty():
+                    request = self._queue.get_nowait()
+                    batch.append(request)
+                    size += len(request[1])
+
+                by_model: Dict[str, List[Tuple[List[str], asyncio.Future]]] = {}
+                for model_path, chunks, future in batch:
+                    by_model.setdefault(model_path, []).append((chunks, future))
+
+                for model_path, requests in by_model.items():
+                    await self._encode_batch(loop, model_path, requests)
+            except Exception:
+                logger.exception("[Embedding] Failed to process embedding batch")
+            finally:
+                # Never leave a caller waiting, whether this batch failed or the worker is stopping
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Embedding batch was not encoded"))
+
+    async def _encode_batch(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        model_path: str,
+        requests: List[Tuple[List[str], asyncio.Future]]
+    ) -> None:
+        """Encode the merged chunks of several requests and resolve each future."""
+        merged = [chunk for chunks, _ in requests for chunk in chunks]
+        logger.info(f"[Embedding] Encoding batch of {len(merged)} chunks from {len(requests)} documents")
+        try:
+            encoded = await loop.run_in_executor(embedding_pool, encode_chunks, model_path, merged)
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for chunks, future in requests:
+            if not future.done():
+                future.set_result(encoded[start:start + len(chunks)])
+            start += len(chunks)
+
+
+# Shared by every upload in this process; started from the app lifespan
+embedding_batcher = EmbeddingBatcher()
+
+
+async def create_embeddings(
+    db: Database,
+    model_path: str,
+    chunks: List[str]
+) -> List[List[float]]:
+    """
+    Embed text chunks, reusing embeddings already stored for identical text
+    under the same model and only encoding the misses.
+    """
+    hashes = [hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in chunks]
+
+    rows = await db.fetch_all(
+        query="""
+        SELECT text_hash, embedding::text AS embedding
+        FROM embedding_cache
+        WHERE model = :model AND text_hash = ANY(:hashes)
+        """,
+        values={"model": model_path, "hashes": list(set(hashes))}
+    )
+    cached = {row["text_hash"]: orjson.loads(row["embedding"]) for row in rows}
+
+    # Identical chunks within the document are encoded once
+    misses = {h: chunk for h, chunk in zip(hashes, chunks) if h not in cached}
+    logger.info(f"[Embedding] {len(chunks) - len(misses)} of {len(chunks)} chunks found in embedding cache")
+
+    if misses:
+        encoded = await embedding_batcher.encode(model_path, list(misses.values()))
+        fresh = dict(zip(misses, encoded))
+
+        await execute_many(
+            db,
+            """
+            INSERT INTO embedding_cache (model, text_hash, embedding)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (model, text_hash) DO NOTHING
+            """,
+            [(model_path, h, orjson.dumps(embedding).decode()) for h, embedding in fresh.items()]
+        )
+        cached.update(fresh)
+
+    return [cached[h] for h in hashes]
+
+
+def read_object(minio_client: Minio, bucket_name: str, object_key: str) -> bytes:
+    """
+    Read an object from MinIO in full, returning its connection to the pool.
+    """
+    response = minio_client.get_object(bucket_name, object_key)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
 
+def extract_text(raw: bytes, content_type: str) -> str:
+    """
+    Extract plain text from a document's raw bytes based on its content type.
+    """
+    return TEXT_EXTRACTORS.get(content_type, extract_plain_text)(raw)
+
+
+def extract_pdf_text(raw: bytes) -> str:
+    """
+    Extract the text of every page of a PDF using PyMuPDF.
+    """
+    # Closing the document releases PyMuPDF's buffers right away
+    import fitz
+
+    with fitz.open(stream=raw, filetype="pdf") as doc:
+        return "\n".join(page.get_text("text") for page in doc)
+
+
+def extract_plain_text(raw: bytes) -> str:
+    """
+    Decode a text document, replacing invalid UTF-8 sequences.
+    """
+    return raw.decode('utf-8', errors='replace')
+
+
+# Content type -> extractor; anything not listed is decoded as plain text
+TEXT_EXTRACTORS = {
+    "application/pdf": extract_pdf_text,
+}
+
+
+async def execute_many(db: Database, query: str, values: List[Tuple]) -> None:
+    """
+    Run a statement for many rows with asyncpg's executemany, which pipelines
+    every row in one round-trip; Database.execute_many sends them one by one.
+    The query uses asyncpg's $n placeholders.
+    """
+    async with db.connection() as connection:
+        await connection.raw_connection.executemany(query, values)
 
 
 async def save_embeddings_to_vectordb(
@@ -192,20 +466,16 @@ async def save_embeddings_to_vectordb(
         # Prepare the query for bulk insert
         query = """
         INSERT INTO embeddings (object_key, embedding, text)
-        VALUES (:object_key, :embedding, :text)
+        VALUES ($1, $2, $3)
         """
 
         values = [
-            {
-                "object_key": object_key,
-                "embedding": json.dumps(embedding),  # ⬅️ serialize the list to JSON
-                "text": chunk
-            }
+            (object_key, orjson.dumps(embedding).decode(), chunk)  # ⬅️ serialize the list to JSON
             for chunk, embedding in zip(chunks, embeddings)
         ]
 
         logger.debug(f"[Embedding] Saving first vector to DB: {embeddings[0][:5]}... (truncated)")
-        await db.execute_many(query=query, values=values)
+        await execute_many(db, query, values)
 
         logger.info(f"[Embedding] Successfully saved {len(values)} embeddings for {object_key}")
 
@@ -220,30 +490,48 @@ async def process_document_embeddings(
     bucket_name: str,
     object_key: str,
     model_path: str,
+    content_type: str = "text/plain",
 ) -> None:
     '''
     Background task to process document embeddings:
-    1. Stream document from MinIO
+    1. Stream document from MinIO and extract its text
     2. Create embeddings in chunks
     3. Save embeddings to vector database
     '''
     logger.info(f"[Embedding] Starting embedding creation for document: {object_key}")
 
     try:
+        # Content-addressed keys mean existing embeddings are still current
+        existing = await db.fetch_one(
+            query="SELECT 1 FROM embeddings WHERE object_key = :object_key LIMIT 1",
+            values={"object_key": object_key}
+        )
+        if existing:
+            logger.info(f"[Embedding] Embeddings already exist for {object_key}, skipping")
+            return
+
+        # The MinIO client blocks, so fetch the object in a worker thread
         logger.info(f"[Embedding] Fetching document from MinIO: {object_key}")
-        data = minio_client.get_object(bucket_name, object_key)
+        loop = asyncio.get_running_loop()
+        raw_text = await loop.run_in_executor(None, read_object, minio_client, bucket_name, object_key)
 
-        # Try to read and decode the file
+        # Try to decode the file
         try:
-            raw_text = data.read()
-            text = raw_text.decode('utf-8', errors='replace')
+            # Only formats that need real parsing are worth pickling over to the
+            # process pool; plain text is just decoded in a thread
+            executor = parse_pool if content_type in TEXT_EXTRACTORS else None
+            text = await loop.run_in_executor(executor, extract_text, raw_text, content_type)
             logger.info(f"[Embedding] Read {len(text)} characters from file")
         except Exception as e:
             logger.error(f"[Embedding]  Failed to read or decode file {object_key}: {str(e)}")
             return
 
         # Create embeddings
-        chunks, embeddings = create_embeddings(model_path, text)
+        chunks = await loop.run_in_executor(embedding_pool, split_text, text)
+        if not chunks:
+            logger.warning(f"[Embedding] No text chunks generated for {object_key} — skipping encoding")
+            return
+        embeddings = await create_embeddings(db, model_path, chunks)
 
         logger.info(f"[Embedding]  Chunked into {len(chunks)} parts")
         logger.info(f"[Embedding]  Created {len(embeddings)} embeddings")
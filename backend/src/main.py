@@ -1,7 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import orjson
 import uvicorn
 import os
 
@@ -11,10 +14,10 @@ from .routes.rag_router import router as rag_router
 
 from .database.config import get_postgres_settings, get_embedding_model_settings
 from .database.dependencies import get_db
-from .database.utils import ensure_model_is_ready
+from .database.utils import ensure_model_is_ready, warm_up_embedding_model, parse_pool, embedding_pool, embedding_batcher
 
 from .minio.config import get_minio_settings
-from .minio.dependencies import get_minio_client
+from .minio.dependencies import get_minio_client, load_known_objects, refresh_known_objects
 from .minio.utils import initialize_minio
 
 # Setup logging - Update to more detailed format
@@ -41,13 +44,19 @@ async def lifespan(app: FastAPI):
             logger.info("Embedding on")
             # Ensure model is ready
             model_settings = get_embedding_model_settings()
-            logger.info(f"Preparing model {model_settings['model']} revision {model_settings['revision']}")
-            model_path = ensure_model_is_ready(minio_client, model_settings['model'], model_settings['revision'])
+            logger.info(f"Preparing model {model_settings.model} revision {model_settings.revision}")
+            model_path = ensure_model_is_ready(minio_client, model_settings.model, model_settings.revision)
             
             # ✅ Set global model path
             app.state.model_path = model_path
             logger.info(f"✅ Model ready at {model_path}")
 
+            # Load the model now rather than on the first request
+            warm_up_embedding_model(model_path)
+
+            # Batch uploads' encode calls together from here on
+            batcher_task = embedding_batcher.start()
+
         else:
             # If embedding is off, still set a dummy or fallback
             app.state.model_path = "sentence-transformers/all-MiniLM-L6-v2"
@@ -57,6 +66,11 @@ async def lifespan(app: FastAPI):
         db = get_db()
         await db.connect()
         logger.info("Database connected")
+
+        # Preload stored object keys so duplicate uploads hit the cache from the start
+        count = await load_known_objects(db)
+        refresh_task = asyncio.create_task(refresh_known_objects(db))
+        logger.info(f"Loaded {count} known object keys")
         
         # Initialize MinIO storage
         initialize_minio()
@@ -67,14 +81,19 @@ async def lifespan(app: FastAPI):
         logger.error(f"Startup error: {e}")
         raise
     finally:
+        if 'refresh_task' in locals():
+            refresh_task.cancel()
+        if 'batcher_task' in locals():
+            batcher_task.cancel()
+
         # Close database connection
         if 'db' in locals():
             await db.disconnect()
         logger.info("Database disconnected")
-        
-        # Cleanup
-        if 'pg_client' in locals():
-            pg_client.close()
+
+        # Release the worker pools once, at process shutdown
+        parse_pool.shutdown(wait=False, cancel_futures=True)
+        embedding_pool.shutdown(wait=False, cancel_futures=True)
         logger.info("Shutting down")
 
 # Create FastAPI app
@@ -83,6 +102,7 @@ app = FastAPI(
     description="API for managing document storage and processing",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 ) 
 
 # Enable CORS - Update to include Authorization header
@@ -99,17 +119,20 @@ app.include_router(storage_router)  # Use the consolidated storage router
 app.include_router(auth_router)     # Authentication router
 app.include_router(rag_router)      # RAG router
 
+# The index payload never changes, so it is serialized once
+INDEX_BODY = orjson.dumps({
+    "message": "Welcome to the Paper Machine API",
+    "docs": "/docs",
+    "auth_endpoints": "/auth",
+    "storage_endpoints": "/storage"
+})
+
 # Index Route
 @app.get("/")
 async def index():
     """Welcome endpoint"""
     logger.info("Index page accessed")
-    return {
-        "message": "Welcome to the Paper Machine API",
-        "docs": "/docs",
-        "auth_endpoints": "/auth",
-        "storage_endpoints": "/storage"
-    }
+    return Response(content=INDEX_BODY, media_type="application/json")
 
 if __name__ == "__main__":
     uvicorn.run("src.main:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
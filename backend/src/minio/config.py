@@ -1,32 +1,86 @@
 import os
 import tempfile
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
 
-VALID_CONTENT_TYPES = {
+VALID_CONTENT_TYPES = frozenset({
     "application/pdf",
     "text/plain",
     "application/json"
     # TODO: add more supported content types as needed
-}
+})
+
+# Largest upload accepted; bigger files are rejected before they are hashed
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
 
 # Model cache settings
 MODEL_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'hf-models')
 os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
 
+# Connection pooling for the shared MinIO client: one pool per host, each keeping
+# up to MINIO_POOL_MAXSIZE connections open for reuse by the worker threads
+MINIO_NUM_POOLS = 4
+MINIO_POOL_MAXSIZE = 32
+MINIO_TIMEOUT = 300
+
+# Multipart chunk size for uploads; files smaller than this go up in a single request
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+
 MODELS_BUCKET = 'hf-models'
 BUCKET_NAME = 'paper-machine'
 
-def get_minio_settings():
+# Internal nginx location proxying to MinIO; when set, /storage/serve hands
+# the transfer to nginx via X-Accel-Redirect instead of streaming it itself
+ACCEL_REDIRECT_PREFIX = os.environ.get('ACCEL_REDIRECT_PREFIX', '').rstrip('/')
+ACCEL_REDIRECT_EXPIRES = timedelta(minutes=5)
+
+# Served files never change under a given key; private since access is per user
+SERVE_CACHE_CONTROL = 'private, max-age=3600'
+
+# Hash used for content-addressed object keys: "sha256" (default) or "blake3",
+# which needs the optional blake3 package. Changing it on an existing bucket
+# only means earlier uploads are no longer detected as duplicates
+UPLOAD_HASHES = frozenset({'sha256', 'blake3'})
+UPLOAD_HASH = (os.environ.get('UPLOAD_HASH') or 'sha256').lower()
+if UPLOAD_HASH not in UPLOAD_HASHES:
+    raise ValueError(f"Unknown UPLOAD_HASH {UPLOAD_HASH!r}, expected one of {sorted(UPLOAD_HASHES)}")
+
+# Read size when hashing uploads, so an upload is never held in memory whole
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Object keys remembered as already stored, to skip the duplicate lookup on re-uploads
+KNOWN_OBJECTS_CACHE_SIZE = 100_000
+# Seconds between reloads of the known keys. This only bounds how long keys removed
+# by other workers linger; validate_upload confirms every hit with MinIO regardless
+KNOWN_OBJECTS_REFRESH_INTERVAL = 300
+
+# Read size when streaming objects back to clients
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Largest page /storage/list will return when paginating
+LIST_PAGE_MAX = 1000
+
+@dataclass(frozen=True)
+class MinioSettings:
+    url: str
+    access_key: str
+    secret_key: str
+    secure: bool
+    models_bucket: str = MODELS_BUCKET
+    custom_corpus_bucket: str = BUCKET_NAME
+
+@lru_cache(maxsize=None)
+def get_minio_settings() -> MinioSettings:
     """
     Get MinIO settings from environment variables
     """
     if not os.environ.get('MINIO_ACCESS_KEY') or not os.environ.get('MINIO_SECRET_KEY') or not os.environ.get('MINIO_SECURE'):
         raise ValueError("MinIO credentials not found in environment variables")
     
-    return {
-        'url': os.environ['MINIO_URL'],
-        'access_key': os.environ['MINIO_ACCESS_KEY'],
-        'secret_key': os.environ['MINIO_SECRET_KEY'],
-        'secure': os.environ['MINIO_SECURE'].lower() == 'true',
-        'models_bucket': MODELS_BUCKET,
-        'custom_corpus_bucket': BUCKET_NAME
-    }
\ No newline at end of file
+    return MinioSettings(
+        url=os.environ['MINIO_URL'],
+        access_key=os.environ['MINIO_ACCESS_KEY'],
+        secret_key=os.environ['MINIO_SECRET_KEY'],
+        secure=os.environ['MINIO_SECURE'].lower() == 'true'
+    )
\ No newline at end of file
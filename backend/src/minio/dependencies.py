@@ -1,30 +1,94 @@
 from fastapi import Depends, HTTPException, status, UploadFile, Form, File
+from fastapi.concurrency import run_in_threadpool
 from minio import Minio
+import certifi
+import urllib3
 from minio.error import S3Error
 from functools import lru_cache
-from .config import get_minio_settings, BUCKET_NAME, MODELS_BUCKET, VALID_CONTENT_TYPES
+from .config import (
+    get_minio_settings,
+    BUCKET_NAME,
+    MODELS_BUCKET,
+    VALID_CONTENT_TYPES,
+    MAX_UPLOAD_BYTES,
+    HASH_CHUNK_SIZE,
+    UPLOAD_HASH,
+    KNOWN_OBJECTS_CACHE_SIZE,
+    KNOWN_OBJECTS_REFRESH_INTERVAL,
+    MINIO_NUM_POOLS,
+    MINIO_POOL_MAXSIZE,
+    MINIO_TIMEOUT
+)
 from .models import FileMetadata, FileInfo, UploadInfo
 from ..database.dependencies import get_db
+import asyncio
 import logging
 import hashlib
-from typing import Annotated
+import os
+from typing import Annotated, BinaryIO, Tuple
+from cachetools import LRUCache
 from databases import Database
 
 logger = logging.getLogger(__name__)
 
+# Object keys known to be stored; keys are content hashes, so a key never
+# points at different content and entries only go stale when removed. Other
+# workers' removals aren't seen here, so a hit is only a hint that
+# validate_upload confirms against MinIO
+_known_objects = LRUCache(maxsize=KNOWN_OBJECTS_CACHE_SIZE)
+
+def remember_object(object_key: str) -> None:
+    """Record that an object is stored, so re-uploads skip the duplicate lookup"""
+    _known_objects[object_key] = True
+
+def forget_object(object_key: str) -> None:
+    """Drop an object from the known set once it is removed"""
+    _known_objects.pop(object_key, None)
+
+async def load_known_objects(db: Database) -> int:
+    """Replace the known object keys with those in the objects table, returning how many were loaded"""
+    rows = await db.fetch_all(
+        query="SELECT object_key FROM objects LIMIT :limit",
+        values={"limit": KNOWN_OBJECTS_CACHE_SIZE}
+    )
+    _known_objects.clear()
+    for row in rows:
+        _known_objects[row["object_key"]] = True
+    return len(rows)
+
+async def refresh_known_objects(db: Database) -> None:
+    """Reload the known object keys periodically until cancelled, dropping keys other workers removed"""
+    while True:
+        await asyncio.sleep(KNOWN_OBJECTS_REFRESH_INTERVAL)
+        try:
+            await load_known_objects(db)
+        except Exception as e:
+            logger.error(f"Failed to refresh known objects: {e}")
+
 @lru_cache()
 def get_minio_client() -> Minio:
     """
     Creates and returns a MinIO client instance.
-    Cached to avoid creating multiple instances.
+    Cached to avoid creating multiple instances. The client's calls block, so
+    async handlers run them with run_in_threadpool; the pool is sized so those
+    threads reuse open connections instead of reconnecting.
     """
     try:
         settings = get_minio_settings()
+        http_client = urllib3.PoolManager(
+            num_pools=MINIO_NUM_POOLS,
+            maxsize=MINIO_POOL_MAXSIZE,
+            timeout=urllib3.Timeout(connect=MINIO_TIMEOUT, read=MINIO_TIMEOUT),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
         client = Minio(
-            settings['url'],
-            access_key=settings['access_key'],
-            secret_key=settings['secret_key'],
-            secure=settings['secure']
+            settings.url,
+            access_key=settings.access_key,
+            secret_key=settings.secret_key,
+            secure=settings.secure,
+            http_client=http_client
         )
         
         # Ensure bucket exists
@@ -60,12 +124,48 @@ async def validate_file(
     if file.content_type not in VALID_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type")
 
+    # Size is known once the upload is spooled; reject before spending time hashing it
+    if file.size == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MiB upload limit"
+        )
+
     # TODO: file validation and cleaning
     return file
 
+# Optional dependency, only needed when selected; imported here so a missing
+# package stops startup instead of failing every upload
+if UPLOAD_HASH == "blake3":
+    try:
+        from blake3 import blake3
+    except ImportError as e:
+        raise ImportError("UPLOAD_HASH=blake3 requires the blake3 package") from e
+
+def _new_digest():
+    """Return a fresh hash object for the configured upload hash"""
+    if UPLOAD_HASH == "blake3":
+        return blake3(max_threads=blake3.AUTO)
+    return hashlib.sha256()
+
+def _hash_stream(fp: BinaryIO) -> Tuple[str, int]:
+    """
+    Hash a file chunk by chunk instead of reading it all into memory.
+    Returns the hex digest and the length in bytes.
+    """
+    digest = _new_digest()
+    length = 0
+    fp.seek(0)
+    while chunk := fp.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        length += len(chunk)
+    return digest.hexdigest(), length
+
 async def validate_upload(
     file: Annotated[UploadFile, Depends(validate_file)],
-    # minio_client: Minio = Depends(get_minio_client)
+    minio_client: Annotated[Minio, Depends(get_minio_client)] = None,
     db: Annotated[Database, Depends(get_db)] = None
 ) -> UploadInfo:
     """
@@ -73,17 +173,34 @@ async def validate_upload(
     Returns the relevant file content and metadata.
     Raises HTTPException if invalid.
     """
-    # Read file and compute hash
-    file_data = await file.read()
-    file_hash = hashlib.sha256(file_data).hexdigest()
-    file_length = len(file_data)
-
+    # Hash in a worker thread; hashlib releases the GIL, so uploads hash in parallel
+    file_hash, file_length = await run_in_threadpool(_hash_stream, file.file)
     await file.seek(0)
 
-    metadata = FileMetadata(
+    # Every field here is already checked or computed above, so build the
+    # models without running pydantic validation again
+    metadata = FileMetadata.model_construct(
         file_name=file.filename,
         content_type=file.content_type
     )
+    fileinfo = FileInfo.model_construct(
+        file=file,
+        file_length=file_length,
+        object_key=file_hash,
+        metadata=metadata
+    )
+
+    if file_hash in _known_objects:
+        # Confirm with a HEAD instead of the database query; if the object is
+        # gone it is uploaded again and its objects row inserted if missing
+        try:
+            await run_in_threadpool(minio_client.stat_object, BUCKET_NAME, file_hash)
+            return UploadInfo.model_construct(duplicate=True, fileinfo=fileinfo)
+        except S3Error as e:
+            forget_object(file_hash)
+            if e.code == "NoSuchKey":
+                return UploadInfo.model_construct(duplicate=False, fileinfo=fileinfo)
+            logger.error(f"MinIO error confirming known object {file_hash}: {e}")
 
     # Check if file with same hash already exists
     try:
@@ -94,16 +211,10 @@ async def validate_upload(
         """
         values = {"object_key": file_hash}
         result = await db.fetch_one(query, values)
+        if result is not None:
+            remember_object(file_hash)
 
-        return UploadInfo(
-            duplicate=result is not None,
-            fileinfo=FileInfo(
-                file=file,
-                file_length=file_length,
-                object_key=file_hash,
-                metadata=metadata
-            )
-        )
+        return UploadInfo.model_construct(duplicate=result is not None, fileinfo=fileinfo)
     except Exception as e:
         logger.error(e)
         raise HTTPException(status_code=500, detail="Failed to check file existence")
\ No newline at end of file
@@ -19,7 +19,7 @@ class UploadInfo(BaseModel):
 
 class Response(BaseModel):
     message: str
-    fileinfo: FileInfo
+    fileinfo: Optional[FileInfo] = None
 
 # Add these new models for folder operations
 class FolderRequest(BaseModel):
@@ -36,4 +36,8 @@ class RemoveFolderRequest(BaseModel):
 class RemoveFolderResponse(BaseModel):
     message: str
     folder_path: str
-    removed_objects: List[str]
\ No newline at end of file
+    removed_objects: List[str]
+
+class ShareFileRequest(BaseModel):
+    object_key: str
+    target_username: str
\ No newline at end of file
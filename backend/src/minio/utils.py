@@ -1,29 +1,18 @@
 import os
-from minio import Minio
 from minio.error import S3Error
 from io import BytesIO
 import logging
-from .config import get_minio_settings, BUCKET_NAME
+from .config import BUCKET_NAME, STREAM_CHUNK_SIZE
+from .dependencies import get_minio_client
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Get MinIO settings from config
-minio_settings = get_minio_settings()
-
-# Initialize MinIO client
-minio_client = Minio(
-    endpoint=minio_settings['url'],
-    access_key=minio_settings['access_key'],
-    secret_key=minio_settings['secret_key'],
-    secure=minio_settings['secure']
-)
-
 def initialize_minio():
     """Initialize MinIO with default bucket if it doesn't exist."""
     try:
-        if not minio_client.bucket_exists(BUCKET_NAME):
-            minio_client.make_bucket(BUCKET_NAME)
+        if not get_minio_client().bucket_exists(BUCKET_NAME):
+            get_minio_client().make_bucket(BUCKET_NAME)
             logger.info(f"Created bucket: {BUCKET_NAME}")
     except S3Error as e:
         logger.error(f"Error initializing MinIO: {e}")
@@ -33,7 +22,7 @@ def create_user_bucket(user_id_prefix):
     """Create a user's storage area within the main bucket."""
     try:
         # Create a folder placeholder for the user
-        minio_client.put_object(
+        get_minio_client().put_object(
             bucket_name=BUCKET_NAME,
             object_name=f"{user_id_prefix}/.folder",
             data=BytesIO(b""),
@@ -46,6 +35,46 @@ def create_user_bucket(user_id_prefix):
         logger.error(f"Error creating user storage area: {e}")
         return False
 
+def parse_byte_range(header, size):
+    """
+    Parse a single-range HTTP Range header ("bytes=start-end", "bytes=start-"
+    or "bytes=-suffix") against an object of the given size.
+    
+    Returns:
+        (start, end) inclusive, or None when the header is absent, malformed or
+        asks for several ranges, in which case the whole object should be sent.
+        start may be >= size, meaning the range is unsatisfiable.
+    """
+    if not header or size is None or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return None
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if last and end < start:
+        return None
+    return start, min(end, size - 1)
+
+def stream_object(response, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a MinIO object response in fixed-size chunks, then return its
+    connection to the pool, even if the client disconnects mid-transfer.
+    """
+    try:
+        yield from response.stream(chunk_size)
+    finally:
+        response.close()
+        response.release_conn()
+
 def get_user_file_prefix(user_id):
     """Get the proper prefix for user files."""
     return f"user-{user_id}/"
@@ -87,7 +116,7 @@ def upload_file(file_data, filename, content_type, user_id=None, folder_path=Non
         logger.info(f"Uploading file with object key: {object_key}")
         
         # Upload the file to MinIO
-        minio_client.put_object(
+        get_minio_client().put_object(
             bucket_name=BUCKET_NAME,
             object_name=object_key,
             data=file_data,
@@ -128,7 +157,7 @@ def download_file(object_key, user_id=None):
                 return None
                 
         # Get the object
-        return minio_client.get_object(BUCKET_NAME, object_key)
+        return get_minio_client().get_object(BUCKET_NAME, object_key)
     
     except S3Error as e:
         logger.error(f"Error downloading file: {e}")
@@ -163,7 +192,7 @@ def list_files(prefix=None, user_id=None, recursive=True):
         logger.info(f"Listing files with prefix: {list_prefix}")
             
         # List objects
-        objects = list(minio_client.list_objects(
+        objects = list(get_minio_client().list_objects(
             bucket_name=BUCKET_NAME,
             prefix=list_prefix,
             recursive=recursive
@@ -200,7 +229,7 @@ def remove_file(object_key, user_id=None):
                 return False
         
         # Remove the object
-        minio_client.remove_object(BUCKET_NAME, object_key)
+        get_minio_client().remove_object(BUCKET_NAME, object_key)
         logger.info(f"File removed: {object_key}")
         return True
     
@@ -236,7 +265,7 @@ def create_folder(folder_name, user_id, parent_folder=None):
         
         # Create folder marker
         folder_marker = f"{folder_path}.folder"
-        minio_client.put_object(
+        get_minio_client().put_object(
             bucket_name=BUCKET_NAME,
             object_name=folder_marker,
             data=BytesIO(b""),
@@ -0,0 +1,163 @@
+import asyncio
+import difflib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from .config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, FUZZY_MATCH_CUTOFF, SEMANTIC_CACHE_THRESHOLD
+
+# Punctuation to drop, keeping operator characters ("2+3", "C++", "C#") and
+# decimal points between digits so they stay part of the key
+_PUNCTUATION = re.compile(r"(?<!\d)\.|\.(?!\d)|[^\w\s.+\-*/=<>%^#]")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_WHITESPACE = re.compile(r"\s+")
+
+CacheKey = Tuple[str, FrozenSet[str]]
+CachedResponse = Tuple[str, List[Dict]]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query for cache lookups: unicode form, case, punctuation and whitespace.
+    Digits and operator characters are kept, since they change what is asked.
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = _PUNCTUATION.sub("", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+class ResponseCache:
+    """
+    LRU cache of RAG responses keyed by the normalized query and the set of
+    object keys it was asked against. A miss on the exact key falls back to a
+    fuzzy match against recent queries over the same objects, so typos and
+    punctuation changes still hit without calling OpenAI. Entries stored with
+    their query embedding can also be found by cosine similarity. Neither
+    near match is accepted unless its numbers are exactly the query's, so
+    "fiscal year 2022" never answers "fiscal year 2023". Entries
+    expire after `ttl` seconds and the cache never holds more than `maxsize`.
+    Callers can single-flight misses for the same key with `claim()` and
+    `release()` so that only one of several identical concurrent requests
+    reaches OpenAI while the others wait for its result.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        cutoff: float = FUZZY_MATCH_CUTOFF,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cutoff = cutoff
+        self.threshold = threshold
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._expires: Dict[CacheKey, float] = {}
+        self._embeddings: Dict[CacheKey, np.ndarray] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+
+    def claim(self, query: str, object_keys: Iterable[str]) -> Tuple[bool, asyncio.Future]:
+        """
+        Return (leader, future) for a cache key. The first caller becomes the
+        leader and must call `release()` once it is done generating; later
+        callers get the leader's future, which resolves at that point.
+        """
+        key = (normalize_query(query), frozenset(object_keys))
+        future = self._inflight.get(key)
+        if future is not None:
+            return False, future
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        return True, future
+
+    def release(self, query: str, object_keys: Iterable[str]) -> None:
+        """Wake the requests waiting on a key's leader, whether or not it cached a response."""
+        future = self._inflight.pop((normalize_query(query), frozenset(object_keys)), None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def get(self, query: str, object_keys: Iterable[str]) -> Optional[CachedResponse]:
+        """Return a cached (response, sources) pair or None."""
+        self._evict_expired()
+        key = (normalize_query(query), frozenset(object_keys))
+
+        if key not in self._entries:
+            numbers = _NUMBER.findall(key[0])
+            candidates = [
+                q for q, scope in self._entries
+                if scope == key[1] and _NUMBER.findall(q) == numbers
+            ]
+            matches = difflib.get_close_matches(key[0], candidates, n=1, cutoff=self.cutoff)
+            if not matches:
+                return None
+            key = (matches[0], key[1])
+
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def get_similar(
+        self,
+        query: str,
+        query_embedding: Sequence[float],
+        object_keys: Iterable[str]
+    ) -> Optional[CachedResponse]:
+        """Return the response of the most similar cached query above the threshold, or None."""
+        self._evict_expired()
+        scope = frozenset(object_keys)
+        numbers = _NUMBER.findall(normalize_query(query))
+        keys = [
+            key for key in self._embeddings
+            if key[1] == scope and _NUMBER.findall(key[0]) == numbers
+        ]
+        if not keys:
+            return None
+
+        scores = np.stack([self._embeddings[key] for key in keys]) @ _unit(query_embedding)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        key = keys[best]
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(
+        self,
+        query: str,
+        object_keys: Iterable[str],
+        response: str,
+        sources: List[Dict],
+        query_embedding: Optional[Sequence[float]] = None
+    ) -> None:
+        """Store a response, evicting the least recently used entry when full."""
+        key = (normalize_query(query), frozenset(object_keys))
+        self._entries[key] = (response, sources)
+        self._entries.move_to_end(key)
+        self._expires[key] = time.monotonic() + self.ttl
+        if query_embedding is not None:
+            self._embeddings[key] = _unit(query_embedding)
+
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self._drop(evicted)
+
+    def _evict_expired(self) -> None:
+        """Drop every entry whose TTL has passed."""
+        now = time.monotonic()
+        for key in [k for k, expires in self._expires.items() if expires <= now]:
+            del self._entries[key]
+            self._drop(key)
+
+    def _drop(self, key: CacheKey) -> None:
+        """Remove the bookkeeping kept alongside an entry."""
+        del self._expires[key]
+        self._embeddings.pop(key, None)
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    """Return the vector as float32 scaled to unit length."""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
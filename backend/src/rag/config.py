@@ -9,4 +9,21 @@ You are a helpful assistant that provides accurate information based on the give
 """
 
 LIMIT_RETRIEVED_CHUNKS = 5
-SIMILARITY_THRESHOLD = 0.7
\ No newline at end of file
+SIMILARITY_THRESHOLD = 0.7
+
+# Retrieval mode: "vector", "fts" (Postgres full-text) or "hybrid"
+RETRIEVAL_MODES = frozenset({"vector", "fts", "hybrid"})
+RETRIEVAL_MODE = (os.environ.get("RETRIEVAL_MODE") or "vector").lower()
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"Unknown RETRIEVAL_MODE {RETRIEVAL_MODE!r}, expected one of {sorted(RETRIEVAL_MODES)}")
+HYBRID_VECTOR_WEIGHT = 0.6
+HYBRID_TEXT_WEIGHT = 0.4
+
+# Number of query embeddings kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+# Response cache settings
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL = 3600  # seconds
+FUZZY_MATCH_CUTOFF = 0.95
+SEMANTIC_CACHE_THRESHOLD = 0.95
@@ -18,7 +18,8 @@ async def validate_object_keys(
     TODO: show error message to user in the case of access error
     """
     username = current_user["username"]
-    logger.info(f"Validating object keys for user {username}: {object_keys}")
+    logger.info("Validating %d object keys for user %s", len(object_keys or []), username)
+    logger.debug("Object keys: %s", object_keys)
     if not object_keys:
         return []
     try:
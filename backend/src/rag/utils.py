@@ -1,34 +1,55 @@
 from fastapi import HTTPException, status
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+from functools import lru_cache
 from openai import AsyncOpenAI
-from .config import OPENAI_API_KEY, OPENAI_MODEL, SYSTEM_PROMPT, LIMIT_RETRIEVED_CHUNKS, SIMILARITY_THRESHOLD
+from .config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    SYSTEM_PROMPT,
+    LIMIT_RETRIEVED_CHUNKS,
+    SIMILARITY_THRESHOLD,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    RETRIEVAL_MODE,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_TEXT_WEIGHT
+)
 from databases import Database
-from sentence_transformers import SentenceTransformer
+from ..database.utils import load_embedding_model
 from ..rag.models import RAGResponse
+from .cache import ResponseCache
+import asyncio
 import logging
-import json
+import orjson
 
 logger = logging.getLogger(__name__)
 
 # Initialize OpenAI client
 client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
+# Cache of recent responses, looked up before any OpenAI call
+response_cache = ResponseCache()
+
+# Streamed generations in flight; holding references keeps them from being garbage collected
+_pending_streams = set()
+
 async def retrieve_relevant_chunks(
     db: Database,
     query_embedding: List[float],
     object_keys: List[str],
+    query_text: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    """Tool to retrieve relevant chunks based on query embedding."""
+    """Tool to retrieve relevant chunks based on query embedding and text."""
     chunks = await search_similar_chunks_by_objects(
         db=db,
         query_embedding=query_embedding,
         object_keys=object_keys,
+        query_text=query_text,
     )
     return chunks
 
-def get_retrieval_tool_description() -> Dict[str, Any]:
-    """Get the description of the retrieval tool for the LLM."""
-    return {
+# Tool schema and system prompt for the retrieval decision call, built once
+RETRIEVAL_TOOLS = [
+    {
         "type": "function",
         "function": {
             "name": "retrieve_context",
@@ -45,23 +66,27 @@ def get_retrieval_tool_description() -> Dict[str, Any]:
             }
         }
     }
+]
 
+DECISION_SYSTEM_PROMPT = SYSTEM_PROMPT + "\nYou have access to a knowledge base. Before answering, decide if you need to retrieve relevant context."
 
 
-
-async def create_rag_response(
+async def build_rag_messages(
     db: Database,
     query: str,
     object_keys: List[str],
     model_path: str,
-) -> Tuple[str, List[str]]:
+    query_embedding: Optional[List[float]] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
     """
-    Creates a response using the LLM, which can optionally retrieve context.
+    Builds the chat messages for a query, letting the LLM decide whether to retrieve context.
+    The query is embedded only if retrieval is requested and no embedding was passed in.
+    Returns a tuple of (messages, sources, chunks); chunks is None if no retrieval was requested.
     """
     messages = [
         {
             "role": "system", 
-            "content": SYSTEM_PROMPT + "\nYou have access to a knowledge base. Before answering, decide if you need to retrieve relevant context."},
+            "content": DECISION_SYSTEM_PROMPT},
         {
             "role": "user", 
             "content": query
@@ -69,57 +94,119 @@ async def create_rag_response(
     ]
 
     sources = []
+    chunks = None
 
-    try:
-        logger.info(" Calling OpenAI to decide if context is needed...")
-        decision_response = await client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=messages,
-            tools=[get_retrieval_tool_description()],
-            tool_choice="auto"
-        )
-        
-        first_message = decision_response.choices[0].message
-        logger.info(f" OpenAI decision: {first_message.tool_calls}")
+    logger.info(" Calling OpenAI to decide if context is needed...")
+    decision_response = await client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=messages,
+        tools=RETRIEVAL_TOOLS,
+        tool_choice="auto"
+    )
+    
+    first_message = decision_response.choices[0].message
+    logger.info(" OpenAI decision: %s", first_message.tool_calls)
 
-        if first_message.tool_calls:
-            logger.info(" Embedding user query and retrieving chunks...")
+    if first_message.tool_calls:
+        logger.info(" Retrieving chunks...")
+        if query_embedding is None:
             query_embedding = await embed_user_query(query, model_path=model_path)
+        chunks = await retrieve_relevant_chunks(
+            db=db,
+            query_embedding=query_embedding,
+            object_keys=object_keys,
+            query_text=query,
+        )
 
-            chunks = await retrieve_relevant_chunks(
-                db=db,
-                query_embedding=query_embedding,
-                object_keys=object_keys,
-            )
+        logger.info("Retrieved %d chunks", len(chunks))
+        if chunks and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Top chunk preview: %s...", chunks[0]["text"][:100])
 
-            logger.info(f"Retrieved {len(chunks)} chunks")
-            if chunks:
-                logger.debug(f"Top chunk preview: {chunks[0]['text'][:100]}...")
+        context = "\n\n".join([chunk["text"] for chunk in chunks])
 
-            context = "\n\n".join([chunk["text"] for chunk in chunks])
-            for chunk in chunks:
-                # get original file name from object key
-                file_name = await db.fetch_one(
-                    query="SELECT original_filename FROM user_files WHERE object_key = :object_key",
-                    values={"object_key": chunk["object_key"]}
-                )
+        # get original file names for all retrieved objects in one query
+        rows = await db.fetch_all(
+            query="""
+            SELECT DISTINCT ON (object_key) object_key, original_filename
+            FROM user_files
+            WHERE object_key = ANY(:object_keys)
+            """,
+            values={"object_keys": list({chunk["object_key"] for chunk in chunks})}
+        )
+        file_names = {row["object_key"]: row["original_filename"] for row in rows}
 
-                sources.append({
-                    "object_key": chunk["object_key"],
-                    "file_name": file_name["original_filename"],
-                    "text": chunk["text"]
-                })
-
-            messages.append({
-                "role": "system",
-                "content": f"""Here is the relevant context:
-                ---------------------
-                {context}
-                ---------------------
-                Use this context to answer the user's query. 
-                If the answer cannot be found in the context, do not answer the question. Instead, apologize and say that you did not find an answer in the context."""
+        for chunk in chunks:
+            sources.append({
+                "object_key": chunk["object_key"],
+                "file_name": file_names.get(chunk["object_key"]),
+                "text": chunk["text"]
             })
 
+        messages.append({
+            "role": "system",
+            "content": f"""Here is the relevant context:
+            ---------------------
+            {context}
+            ---------------------
+            Use this context to answer the user's query. 
+            If the answer cannot be found in the context, do not answer the question. Instead, apologize and say that you did not find an answer in the context."""
+        })
+
+    return messages, sources, chunks
+
+
+async def create_rag_response(
+    db: Database,
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    semantic_cache: bool = True,
+) -> Tuple[str, List[str]]:
+    """
+    Creates a response using the LLM, which can optionally retrieve context.
+    With semantic_cache off, the query is only embedded if context is retrieved.
+    """
+    cached = response_cache.get(query, object_keys)
+    if cached is not None:
+        logger.info("Returning cached response")
+        return cached
+
+    # Concurrent misses for the same question wait for the first one to fill the cache
+    leader, inflight = response_cache.claim(query, object_keys)
+    if leader:
+        try:
+            return await _generate_rag_response(db, query, object_keys, model_path, semantic_cache)
+        finally:
+            response_cache.release(query, object_keys)
+
+    await asyncio.shield(inflight)
+    cached = response_cache.get(query, object_keys)
+    if cached is not None:
+        logger.info("Returning cached response")
+        return cached
+
+    # The leader's answer wasn't cacheable, so generate independently
+    return await _generate_rag_response(db, query, object_keys, model_path, semantic_cache)
+
+
+async def _generate_rag_response(
+    db: Database,
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    semantic_cache: bool,
+) -> Tuple[str, List[str]]:
+    """
+    Generates and caches a response for a query that missed the exact-match cache.
+    """
+    try:
+        query_embedding, cached = await _lookup_similar(query, object_keys, model_path, semantic_cache)
+        if cached is not None:
+            logger.info("Returning semantically cached response")
+            return cached
+
+        messages, sources, chunks = await build_rag_messages(db, query, object_keys, model_path, query_embedding)
+
         logger.info("Generating final response from OpenAI...")
         final_response = await client.chat.completions.create(
             model=OPENAI_MODEL,
@@ -127,7 +214,11 @@ async def create_rag_response(
         )
 
         result = final_response.choices[0].message.content
-        logger.info(f"Final response: {result[:100]}...")
+        logger.debug("Final response: %.100s...", result)
+
+        # Don't cache answers given before the documents' embeddings existed
+        if chunks is None or chunks:
+            response_cache.put(query, object_keys, result, sources, query_embedding=query_embedding)
 
         return result, sources
 
@@ -136,19 +227,169 @@ async def create_rag_response(
         return f"Error generating response: {str(e)}", []
 
 
+async def stream_rag_response(
+    db: Database,
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    semantic_cache: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams a response as events: the sources first, then the answer as it is generated.
+    With semantic_cache off, the query is only embedded if context is retrieved.
+    """
+    cached = response_cache.get(query, object_keys)
+    if cached is None:
+        # Concurrent misses for the same question wait for the first one to fill the cache
+        leader, inflight = response_cache.claim(query, object_keys)
+        if leader:
+            events = _lead_rag_stream(db, query, object_keys, model_path, semantic_cache)
+        else:
+            await asyncio.shield(inflight)
+            cached = response_cache.get(query, object_keys)
+            if cached is None:
+                # The leader's answer wasn't cacheable, so generate independently
+                events = _generate_rag_stream(db, query, object_keys, model_path, semantic_cache)
+
+        if cached is None:
+            async for event in events:
+                yield event
+            return
+
+    logger.info("Returning cached response")
+    result, sources = cached
+    yield {"type": "sources", "sources": sources}
+    yield {"type": "token", "content": result}
+    yield {"type": "done"}
+
+
+async def _lead_rag_stream(
+    db: Database,
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    semantic_cache: bool,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams a response on behalf of every request waiting on the same key.
+    Generation runs in its own task and releases the key as soon as the answer
+    is complete, however slowly (or whether) this client reads the stream.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            async for event in _generate_rag_stream(db, query, object_keys, model_path, semantic_cache):
+                events.put_nowait(event)
+        finally:
+            response_cache.release(query, object_keys)
+            events.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    _pending_streams.add(task)
+    task.add_done_callback(_pending_streams.discard)
+
+    while (event := await events.get()) is not None:
+        yield event
+
+
+async def _generate_rag_stream(
+    db: Database,
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    semantic_cache: bool,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams and caches a response for a query that missed the exact-match cache.
+    """
+    try:
+        query_embedding, cached = await _lookup_similar(query, object_keys, model_path, semantic_cache)
+        if cached is not None:
+            logger.info("Returning semantically cached response")
+            result, sources = cached
+            yield {"type": "sources", "sources": sources}
+            yield {"type": "token", "content": result}
+            yield {"type": "done"}
+            return
+
+        messages, sources, chunks = await build_rag_messages(db, query, object_keys, model_path, query_embedding)
+        yield {"type": "sources", "sources": sources}
+
+        logger.info("Streaming final response from OpenAI...")
+        stream = await client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            stream=True,
+        )
+
+        parts = []
+        async for event in stream:
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield {"type": "token", "content": delta}
+
+        result = "".join(parts)
+        logger.debug("Final response: %.100s...", result)
+
+        # Don't cache answers given before the documents' embeddings existed
+        if chunks is None or chunks:
+            response_cache.put(query, object_keys, result, sources, query_embedding=query_embedding)
+
+        yield {"type": "done"}
+
+    except Exception as e:
+        logger.exception(f"Error in stream_rag_response: {str(e)}")
+        yield {"type": "error", "detail": f"Error generating response: {str(e)}"}
+
+
+async def _lookup_similar(
+    query: str,
+    object_keys: List[str],
+    model_path: str,
+    enabled: bool,
+) -> Tuple[Optional[List[float]], Optional[Tuple[str, List[Dict]]]]:
+    """
+    Embed the query and look for a cached response to a similar query.
+    Best effort: if disabled or the embedding fails, returns (None, None) and
+    the caller carries on to the decision call without it.
+    """
+    if not enabled:
+        return None, None
+    try:
+        query_embedding = await embed_user_query(query, model_path=model_path)
+    except Exception as e:
+        logger.warning("Skipping semantic cache lookup, query embedding failed: %s", e)
+        return None, None
+    return query_embedding, response_cache.get_similar(query, query_embedding, object_keys)
+
+
 async def embed_user_query(
     query: str,
     model_path: str
 ) -> List[float]:
     """
     Embed a user query using a given model.
+    Encoding runs in a worker thread so the event loop stays free.
     """
-    # Load the model
-    model = SentenceTransformer(model_path)
+    query_embedding = await asyncio.to_thread(_encode_query, query, model_path)
+    return list(query_embedding)
+
+
+@lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+def _encode_query(query: str, model_path: str) -> Tuple[float, ...]:
+    """
+    Encode a single query with the resident model (blocking).
+    Memoized so repeated queries skip the model entirely.
+    """
+    model = load_embedding_model(model_path)
     
     # Generate embedding
     query_embedding = model.encode(query).tolist()
-    return query_embedding
+    return tuple(query_embedding)
 
 
 async def search_similar_chunks_by_objects(
@@ -156,30 +397,106 @@ async def search_similar_chunks_by_objects(
     query_embedding: List[float],
     object_keys: List[str],
     limit: int = 5,
-    similarity_threshold: float = 0.7
+    similarity_threshold: float = 0.7,
+    query_text: Optional[str] = None,
+    mode: str = RETRIEVAL_MODE
 ) -> List[Dict[str, Any]]:
-    logger.info(f"Searching for similar chunks by objects: {object_keys}")
+    """
+    Search chunks of the given objects by vector similarity ("vector"),
+    full-text rank ("fts") or a weighted sum of both ("hybrid").
+    """
+    logger.info("Searching for similar chunks in %d objects", len(object_keys))
+    if mode != "vector" and not query_text:
+        mode = "vector"
+
     try:
-        query = """
-        SELECT 
-            text,
-            object_key,
-            1 - (embedding <=> :query_embedding) AS similarity
-        FROM embeddings
-        WHERE 
-            object_key = ANY(:object_keys)
-            AND 1 - (embedding <=> :query_embedding) > :threshold
-        ORDER BY similarity DESC
-        LIMIT :limit
-        """
-        values = {
-            "query_embedding": f"[{', '.join(map(str, query_embedding))}]",  # 🛠️ format for pgvector
-            "object_keys": object_keys,
-            "threshold": similarity_threshold,
-            "limit": limit,
-        }
+        if mode == "vector":
+            # Order by raw distance so Postgres can walk the HNSW index. The
+            # object filter is applied to the index's candidates, so the scan
+            # runs iteratively (see below) and the relaxed order is re-sorted.
+            # The similarity threshold is applied outside the CTE: inside it, a
+            # query with fewer than LIMIT close chunks would keep the iterative
+            # scan going until hnsw.max_scan_tuples
+            query = """
+            WITH candidates AS MATERIALIZED (
+                SELECT 
+                    text,
+                    object_key,
+                    embedding <=> :query_embedding AS distance
+                FROM embeddings
+                WHERE object_key = ANY(:object_keys)
+                ORDER BY distance
+                LIMIT :limit
+            )
+            SELECT text, object_key, 1 - distance AS similarity
+            FROM candidates
+            WHERE distance < :max_distance
+            ORDER BY distance
+            """
+            values = {
+                "query_embedding": orjson.dumps(query_embedding).decode(),  # 🛠️ format for pgvector
+                "object_keys": object_keys,
+                "max_distance": 1 - similarity_threshold,
+                "limit": limit,
+            }
+        elif mode == "fts":
+            # Rank normalization 32 maps ts_rank_cd into [0, 1)
+            query = """
+            SELECT 
+                text,
+                object_key,
+                ts_rank_cd(text_search, ts_query, 32) AS similarity
+            FROM embeddings, websearch_to_tsquery('english', :query_text) AS ts_query
+            WHERE 
+                object_key = ANY(:object_keys)
+                AND text_search @@ ts_query
+            ORDER BY similarity DESC
+            LIMIT :limit
+            """
+            values = {
+                "query_text": query_text,
+                "object_keys": object_keys,
+                "limit": limit,
+            }
+        elif mode == "hybrid":
+            query = """
+            SELECT 
+                text,
+                object_key,
+                :vector_weight * (1 - (embedding <=> :query_embedding))
+                    + :text_weight * ts_rank_cd(text_search, ts_query, 32) AS similarity
+            FROM embeddings, websearch_to_tsquery('english', :query_text) AS ts_query
+            WHERE 
+                object_key = ANY(:object_keys)
+                AND (
+                    text_search @@ ts_query
+                    OR embedding <=> :query_embedding < :max_distance
+                )
+            ORDER BY similarity DESC
+            LIMIT :limit
+            """
+            values = {
+                "query_embedding": orjson.dumps(query_embedding).decode(),
+                "query_text": query_text,
+                "object_keys": object_keys,
+                "max_distance": 1 - similarity_threshold,
+                "vector_weight": HYBRID_VECTOR_WEIGHT,
+                "text_weight": HYBRID_TEXT_WEIGHT,
+                "limit": limit,
+            }
+        else:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
 
-        results = await db.fetch_all(query, values)
+        if mode == "vector":
+            # A plain HNSW scan returns only hnsw.ef_search (40) candidates before
+            # the object filter, so users owning a small share of the corpus got
+            # few or no chunks; iterative scans keep going until LIMIT is met
+            # (pgvector >= 0.8)
+            async with db.transaction():
+                await db.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+                results = await db.fetch_all(query, values)
+        else:
+            results = await db.fetch_all(query, values)
 
         return [
             {
@@ -192,4 +509,4 @@ async def search_similar_chunks_by_objects(
 
     except Exception as error:
         logger.error(f"Error performing semantic search: {error}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error))
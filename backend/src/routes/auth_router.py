@@ -1,4 +1,5 @@
 from datetime import timedelta, datetime
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from ..database.dependencies import get_db
@@ -8,6 +9,7 @@ from ..auth.utils import (
     create_access_token, 
     get_password_hash, 
     get_user,
+    invalidate_user,
     get_current_user, 
     oauth2_scheme,
     ACCESS_TOKEN_EXPIRE_MINUTES
@@ -30,8 +32,8 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
             detail="Username already registered"
         )
     
-    # Hash the password
-    hashed_password = get_password_hash(user_data.password)
+    # Hash the password in a worker thread so the event loop keeps serving requests
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     
     # Insert user into database
     query = """
@@ -46,6 +48,7 @@ async def register(user_data: UserCreate, db = Depends(get_db)):
     }
     
     user = await db.fetch_one(query=query, values=values)
+    invalidate_user(user_data.username)
     
     # Generate access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -104,7 +107,7 @@ async def auth_debug(
         
         try:
             # Import here to avoid circular imports
-            from ..auth.auth_utils import SECRET_KEY, ALGORITHM
+            from ..auth.config import SECRET_KEY, ALGORITHM
             import jwt
             
             # Try to decode without verification
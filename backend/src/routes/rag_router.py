@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from typing import Annotated, List
 import logging
+import orjson
 
-from ..rag.utils import create_rag_response
+from ..rag.utils import create_rag_response, stream_rag_response
 
 from databases import Database
 from ..database.dependencies import get_db
@@ -36,12 +38,37 @@ async def chat(
         db=db,
         query=query,
         object_keys=object_keys,
-        model_path=request.app.state.model_path
+        model_path=request.app.state.model_path,
+        semantic_cache=request.app.state.embed_on
     )
 
-    logger.info(f"Returning response to frontend: {response_text[:100]}...")
+    logger.debug("Returning response to frontend: %.100s...", response_text)
     return RAGResponse(
         response=response_text,
         sources=sources
     )
-    
\ No newline at end of file
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+    payload: ChatRequest,
+    current_user: Annotated[dict, Depends(get_current_user)],
+    db: Annotated[Database, Depends(get_db)],
+    request: Request
+) -> StreamingResponse:
+    """
+    Endpoint for RAG chatbot that streams the answer as newline-delimited JSON events
+    """
+    events = stream_rag_response(
+        db=db,
+        query=payload.query,
+        object_keys=payload.object_keys,
+        model_path=request.app.state.model_path,
+        semantic_cache=request.app.state.embed_on
+    )
+
+    async def generate():
+        async for event in events:
+            yield orjson.dumps(event) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -1,56 +1,32 @@
-from fastapi import Depends, APIRouter, UploadFile, File, HTTPException, status, BackgroundTasks, Request, Form, Query
-from fastapi.responses import StreamingResponse
-from typing import List, Annotated, Any, Optional, Dict
+from fastapi import Depends, APIRouter, UploadFile, HTTPException, status, BackgroundTasks, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response as RawResponse
+from typing import Annotated, Optional
 from minio import Minio
 import logging
 import urllib.parse
 from databases import Database
-from pydantic import BaseModel
 
 from ..database.dependencies import get_db
 from ..database.utils import process_document_embeddings
 
 from ..auth.utils import get_current_user, get_user
 
-from ..minio.config import BUCKET_NAME
-from ..minio.dependencies import FileInfo, validate_upload, get_minio_client
-from ..minio.utils import (
-    upload_file,
-    download_file,
-    list_files,
-    remove_file,
-    create_folder,
-    get_user_file_prefix
+from ..minio.config import (
+    BUCKET_NAME,
+    ACCEL_REDIRECT_PREFIX,
+    ACCEL_REDIRECT_EXPIRES,
+    UPLOAD_PART_SIZE,
+    SERVE_CACHE_CONTROL,
+    LIST_PAGE_MAX
 )
+from ..minio.dependencies import validate_upload, get_minio_client, remember_object, forget_object
+from ..minio.models import Response, ShareFileRequest
+from ..minio.utils import parse_byte_range, stream_object
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/storage", tags=["storage"])
 
-class Response(BaseModel):
-    message: str
-    fileinfo: Optional[FileInfo] = None
-
-# Add these new models for folder operations
-class FolderRequest(BaseModel):
-    folder_name: str
-    folder_path: Optional[str] = None
-    
-class FolderResponse(BaseModel):
-    message: str
-    folder_info: dict
-
-class RemoveFolderRequest(BaseModel):
-    folder_path: str
-
-class RemoveFolderResponse(BaseModel):
-    message: str
-    folder_path: str
-    removed_objects: List[str]
-
-class ShareFileRequest(BaseModel):
-    object_key: str
-    target_username: str
-
 @router.post("/upload")
 async def upload_document(
     uploadinfo: Annotated[UploadFile, Depends(validate_upload)],
@@ -67,18 +43,21 @@ async def upload_document(
     logger.info(f"Upload endpoint triggered by user {username}")
 
     fileinfo = uploadinfo.fileinfo
+    content_type = fileinfo.metadata.content_type or "application/octet-stream"
     
     # File is not a duplicate, need to reupload
     if not uploadinfo.duplicate:
         logger.info(f"File is not a duplicate, need to upload: {fileinfo.object_key}")
-        # Upload directly to MinIO using put_object
+        # Stream the spooled upload to MinIO from a worker thread, keeping the event loop free
         try:
-            minio_client.put_object(
+            await run_in_threadpool(
+                minio_client.put_object,
                 bucket_name=BUCKET_NAME,
                 object_name=fileinfo.object_key,
                 data=fileinfo.file.file,
                 length=fileinfo.file_length,
-                content_type=fileinfo.metadata.content_type or "application/octet-stream",
+                part_size=UPLOAD_PART_SIZE,
+                content_type=content_type,
                 metadata={
                     "file_name": fileinfo.metadata.file_name,
                     "content_type": fileinfo.metadata.content_type
@@ -89,13 +68,15 @@ async def upload_document(
             query = """
             INSERT INTO objects (object_key, content_type, size)
             VALUES (:object_key, :content_type, :size)
+            ON CONFLICT (object_key) DO NOTHING
             """
             values = {
                 "object_key": fileinfo.object_key,
-                "content_type": fileinfo.metadata.content_type or "application/octet-stream",
+                "content_type": content_type,
                 "size": fileinfo.file_length
             }
             await db.execute(query=query, values=values)
+            remember_object(fileinfo.object_key)
             logger.info(f"Recorded object upload in database: {fileinfo.object_key}")
 
             # Get model path from app state
@@ -114,7 +95,8 @@ async def upload_document(
                     db=db,
                     bucket_name=BUCKET_NAME,
                     object_key=fileinfo.object_key,
-                    model_path=model_path
+                    model_path=model_path,
+                    content_type=fileinfo.metadata.content_type
                 )
 
                 logger.info(f"[Embedding] 📦 Background task scheduled for {fileinfo.object_key}")
@@ -138,7 +120,7 @@ async def upload_document(
             "username": username,
             "object_key": fileinfo.object_key,
             "original_filename": fileinfo.metadata.file_name,
-            "content_type": fileinfo.metadata.content_type or "application/octet-stream"
+            "content_type": content_type
         }
         
         file_record = await db.execute(query=query, values=values)
@@ -207,7 +189,7 @@ async def remove_document(
         )
         if result == 0:
             # Remove the object from MinIO
-            minio_client.remove_object(BUCKET_NAME, object_key)
+            await run_in_threadpool(minio_client.remove_object, BUCKET_NAME, object_key)
 
             # Remove the database record
             query = """
@@ -218,6 +200,10 @@ async def remove_document(
                 query=query, 
                 values={"object_key": object_key}
             )
+
+            # Forget the key only once both are gone; a concurrent upload seeing
+            # the row before then would otherwise remember it again
+            forget_object(object_key)
         
         return {
             "message": "File removed successfully",
@@ -233,6 +219,7 @@ async def remove_document(
 @router.get("/serve/{object_key}")
 async def serve_file(
     object_key: str,
+    request: Request,
     current_user: dict = Depends(get_current_user),
     minio_client: Annotated[Minio, Depends(get_minio_client)] = None,
     db = Depends(get_db)
@@ -243,7 +230,7 @@ async def serve_file(
     
     username = current_user["username"]
     # user_prefix = get_user_file_prefix(user_id)
-    logger.info(f"Serve endpoint triggered by user {username} for object: {object_key}")
+    logger.info("Serve endpoint triggered by user %s for object: %s", username, object_key)
     
     # Verify the object belongs to this user
 
@@ -257,8 +244,10 @@ async def serve_file(
     try:
         # Lookup file metadata in database
         query = """
-        SELECT original_filename, content_type FROM user_files 
-        WHERE username = :username AND object_key = :object_key
+        SELECT uf.original_filename, uf.content_type, o.size
+        FROM user_files uf
+        JOIN objects o ON o.object_key = uf.object_key
+        WHERE uf.username = :username AND uf.object_key = :object_key
         """
         
         file_record = await db.fetch_one(
@@ -273,8 +262,47 @@ async def serve_file(
                 detail="You do not have permission to access this file"
             )
         
+        media_type = file_record["content_type"] or "application/octet-stream"
+        etag = f'"{object_key}"'
+        headers = {
+            'Content-Disposition': f'inline; filename="{file_record["original_filename"]}"',
+            'Content-Type': media_type,
+            'ETag': etag,
+            'Cache-Control': SERVE_CACHE_CONTROL,
+            'Accept-Ranges': 'bytes'
+        }
+
+        # Object keys are content hashes, so a matching ETag means the client's copy is current
+        if etag in request.headers.get("if-none-match", ""):
+            return RawResponse(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        # Behind nginx, let the proxy fetch the bytes from MinIO with a short-lived signed URL
+        if ACCEL_REDIRECT_PREFIX:
+            signed = urllib.parse.urlsplit(await run_in_threadpool(
+                minio_client.presigned_get_object, BUCKET_NAME, object_key, expires=ACCEL_REDIRECT_EXPIRES
+            ))
+            headers['X-Accel-Redirect'] = f"{ACCEL_REDIRECT_PREFIX}{signed.path}?{signed.query}"
+            return RawResponse(headers=headers, media_type=media_type)
+
+        # Serve a single byte range when asked, so viewers can fetch pages of large PDFs
+        size = file_record["size"]
+        byte_range = parse_byte_range(request.headers.get("range"), size)
+        if byte_range is None:
+            start, length, status_code = 0, 0, status.HTTP_200_OK
+            if size is not None:
+                headers['Content-Length'] = str(size)
+        else:
+            start, end = byte_range
+            if start >= size:
+                headers['Content-Range'] = f"bytes */{size}"
+                return RawResponse(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers=headers)
+            length = end - start + 1
+            headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+            headers['Content-Length'] = str(length)
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+
         # Get file data from MinIO
-        data = minio_client.get_object(BUCKET_NAME, object_key)
+        data = await run_in_threadpool(minio_client.get_object, BUCKET_NAME, object_key, offset=start, length=length)
         if not data:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -282,12 +310,10 @@ async def serve_file(
             )
         
         return StreamingResponse(
-            data.stream(),
-            media_type=file_record["content_type"] or "application/octet-stream",
-            headers={
-                'Content-Disposition': f'inline; filename="{file_record["original_filename"]}"',
-                'Content-Type': file_record["content_type"] or "application/octet-stream"
-            }
+            stream_object(data),
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers
         )
     except HTTPException as e:
         raise e
@@ -301,44 +327,43 @@ async def serve_file(
 @router.get("/list")
 async def list_files(
     current_user: dict = Depends(get_current_user),
-    db: Annotated[Database, Depends(get_db)] = None
+    db: Annotated[Database, Depends(get_db)] = None,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_PAGE_MAX),
+    offset: int = Query(0, ge=0)
 ):
     """
-    List all files user has access to.
+    List all files user has access to, optionally one page at a time.
     NOTE: At the moment, there is no folder structure in object store due to
     the implementation of file and embedding deduplication.
     Folder structure may need to be client-side
     """
     username = current_user["username"]
 
+    # Object details come from the same query rather than one lookup per file;
+    # a NULL limit returns every remaining row
     query = """
-    SELECT *
-    FROM user_files
-    WHERE username = :username
+    SELECT uf.object_key, uf.original_filename, o.content_type, o.size
+    FROM user_files uf
+    JOIN objects o ON o.object_key = uf.object_key
+    WHERE uf.username = :username
+    ORDER BY uf.id
+    LIMIT :limit OFFSET :offset
     """
-    values = {"username": username}
-    user_files = await db.fetch_all(query=query, values=values)
-
-    files = []
-    for entry in user_files:
-        query = """
-        SELECT *
-        FROM objects
-        WHERE object_key = :object_key
-        """
-        values = {"object_key": entry.object_key}
-        obj = await db.fetch_one(query=query, values=values)
+    values = {"username": username, "limit": limit, "offset": offset}
+    rows = await db.fetch_all(query=query, values=values)
 
-        files.append({
-            "object_key": obj.object_key,
+    return [
+        {
+            "object_key": row["object_key"],
             "metadata": {
-                "file_name": entry.original_filename,
-                "content_type": obj.content_type,
-                "size": obj.size,
+                "file_name": row["original_filename"],
+                "content_type": row["content_type"],
+                "size": row["size"],
                 # "last_modified": obj.last_modified.isoformat() if obj.last_modified else None
             }
-        })
-    return files
+        }
+        for row in rows
+    ]
 
 @router.post("/share")
 async def share_file(